@@ -1,13 +1,15 @@
+import functools
 import io
 from datetime import datetime
-from typing import Tuple, List
+from typing import Tuple
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 
@@ -25,6 +27,16 @@ PRIMARY_TITLE = "CompliScore – Compliance Health Dashboard"
 SUBTITLE = "Low‑cost compliance monitoring for small and mid‑sized brokers"
 
 
+def _frame_key(df: pd.DataFrame) -> Tuple[tuple, bytes]:
+	"""Identify a frame by its full content."""
+	return tuple(df.columns), pd.util.hash_pandas_object(df, index=True).values.tobytes()
+
+
+# Hash frames by full content so cached results are reused across reruns
+_DF_HASH_FUNCS = {pd.DataFrame: _frame_key}
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
 def get_demo_dataset(n: int = 30) -> pd.DataFrame:
 	"""Generate a realistic demo dataset with n broker entries."""
 	broker_prefixes = [
@@ -38,111 +50,155 @@ def get_demo_dataset(n: int = 30) -> pd.DataFrame:
 		"Markets", "Partners", "Financial", "Holdings",
 	]
 
-	def name(i: int) -> str:
-		p = broker_prefixes[i % len(broker_prefixes)]
-		s = broker_suffixes[(i * 3) % len(broker_suffixes)]
-		return f"{p} {s}"
-
 	# Construct varied values with some intentional spread
-	data = []
-	for i in range(n):
-		broker_name = name(i)
-		kyc_completed = "Y" if (i % 3 != 0) else "N"
-		capital_adequacy = 90 + ((i * 11) % 40)  # 90% to 129%
-		client_complaints = (i * 2) % 7  # 0..6
-		reporting_delay = (i % 4)  # 0..3 days
-		data.append(
-			{
-				"Broker Name": broker_name,
-				"KYC Completed (Y/N)": kyc_completed,
-				"Capital Adequacy %": capital_adequacy,
-				"Client Complaints": client_complaints,
-				"Reporting Delay (days)": reporting_delay,
-			}
-		)
-	return pd.DataFrame(data)
+	i = np.arange(n)
+	prefixes = np.array(broker_prefixes)[i % len(broker_prefixes)]
+	suffixes = np.array(broker_suffixes)[(i * 3) % len(broker_suffixes)]
+	return pd.DataFrame(
+		{
+			"Broker Name": np.char.add(np.char.add(prefixes, " "), suffixes),
+			"KYC Completed (Y/N)": np.where(i % 3 != 0, "Y", "N"),
+			"Capital Adequacy %": 90 + (i * 11) % 40,  # 90% to 129%
+			"Client Complaints": (i * 2) % 7,  # 0..6
+			"Reporting Delay (days)": i % 4,  # 0..3 days
+		}
+	)
 
 
-def compute_score_and_flags(row: pd.Series) -> Tuple[int, List[str]]:
-	"""Compute compliance score (0..100) and failed checks list for a broker."""
-	score = 0
-	failed: List[str] = []
+def _to_float(col: pd.Series) -> pd.Series:
+	"""Parse a numeric input column as float64; unparseable text counts as 0, blanks stay NaN."""
+	values = pd.Series(
+		pd.to_numeric(col, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan),
+		index=col.index,
+	)
+	return values.mask(values.isna() & col.notna(), 0.0)
+
+
+def compute_score_and_flags(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+	"""Compute compliance scores (0..100) and failed checks for every broker at once.
+
+	Numeric inputs are coerced into local float64 series so the frame keeps
+	the values as uploaded. A blank capital adequacy or reporting delay is
+	NaN and fails its checks; complaints are truncated like int(), with
+	blank or non-finite counts taken as 0.
+	"""
+	# Arrow strings keep the text checks in Arrow compute; missing flags count as "N"
+	kyc_ok = (
+		df["KYC Completed (Y/N)"].astype("string[pyarrow]")
+		.str.strip().str.upper().eq("Y")
+		.fillna(False).astype(bool)
+	)
+	cap = _to_float(df["Capital Adequacy %"])
+	complaints = _to_float(df["Client Complaints"])
+	complaints = np.trunc(complaints.where(np.isfinite(complaints), 0.0))
+	delay = _to_float(df["Reporting Delay (days)"])
+
+	checks = [
+		(kyc_ok, "KYC not completed"),
+		(cap >= 100, "Capital adequacy < 100%"),
+		(complaints <= 2, "Complaints > 2"),
+		(delay <= 1, "Reporting delay > 1 day"),
+		# No major breaches condition
+		((complaints <= 2) & (delay <= 1), "Major breaches present"),
+	]
 
-	# KYC Completed
-	if str(row.get("KYC Completed (Y/N)", "")).strip().upper() == "Y":
-		score += 20
-	else:
-		failed.append("KYC not completed")
+	# 0..100 fits in int8
+	score = (sum(passed.astype(int) for passed, _ in checks) * 20).astype("int8")
+
+	# Encode the failed checks of each row as a bitmask and look up the
+	# prejoined text for that combination (2**5 entries); "-" when none failed
+	labels = [label for _, label in checks]
+	combos = np.array([
+		", ".join(label for bit, label in enumerate(labels) if code & (1 << bit)) or "-"
+		for code in range(1 << len(labels))
+	], dtype=object)
+	codes = sum((~passed).to_numpy(dtype=bool).astype(np.int8) << bit for bit, (passed, _) in enumerate(checks))
+	failed = pd.Series(combos[codes], index=df.index, dtype="string[pyarrow]")
+	return score, failed
 
-	# Capital Adequacy
-	try:
-		cap = float(row.get("Capital Adequacy %", 0))
-	except Exception:
-		cap = 0.0
-	if cap >= 100:
-		score += 20
-	else:
-		failed.append("Capital adequacy < 100%")
 
-	# Client Complaints
-	try:
-		complaints = int(row.get("Client Complaints", 0))
-	except Exception:
-		complaints = 0
-	if complaints <= 2:
-		score += 20
-	else:
-		failed.append("Complaints > 2")
+# Status levels, from best to worst
+_STATUS_LEVELS = ("Compliant", "Needs Attention", "Non-Compliant")
 
-	# Reporting Delay
-	try:
-		delay = float(row.get("Reporting Delay (days)", 0))
-	except Exception:
-		delay = 0.0
-	if delay <= 1:
-		score += 20
-	else:
-		failed.append("Reporting delay > 1 day")
-
-	# No major breaches condition
-	if complaints <= 2 and delay <= 1:
-		score += 20
-	else:
-		failed.append("Major breaches present")
 
-	return score, failed
+def status_from_score(score: pd.Series) -> pd.Series:
+	# Relatable terms instead of color names
+	status = np.select(
+		[score >= 80, score >= 50],
+		list(_STATUS_LEVELS[:2]),
+		default=_STATUS_LEVELS[2],
+	)
+	# Fixed, ordered categories keep legends and grouping in severity order
+	return pd.Series(
+		pd.Categorical(status, categories=_STATUS_LEVELS, ordered=True),
+		index=score.index,
+	)
 
 
-def status_from_score(score: int) -> str:
-	# Relatable terms instead of color names
-	if score >= 80:
-		return "Compliant"
-	elif score >= 50:
-		return "Needs Attention"
-	return "Non-Compliant"
+_STATUS_COLORS = dict(zip(_STATUS_LEVELS, ("#2e7d32", "#f9a825", "#c62828")))
+_STATUS_DEFAULT = "#424242"
 
 
 def color_for_status(status: str) -> str:
-	return {
-		"Compliant": "#2e7d32",
-		"Needs Attention": "#f9a825",
-		"Non-Compliant": "#c62828",
-	}.get(status, "#424242")
+	return _STATUS_COLORS.get(status, _STATUS_DEFAULT)
 
 
-def load_input_dataframe(uploaded_file) -> pd.DataFrame:
-	if uploaded_file is None:
-		return get_demo_dataset(30)
+# Cell styles for the Status column of the broker table
+_STATUS_CSS = {
+	status: f"color: white; background-color: {color_for_status(status)}"
+	for status in _STATUS_LEVELS
+}
 
-	name = uploaded_file.name.lower()
-	if name.endswith(".csv"):
-		return pd.read_csv(uploaded_file)
-	elif name.endswith(".xls") or name.endswith(".xlsx"):
-		return pd.read_excel(uploaded_file)
-	else:
-		raise ValueError("Unsupported file format. Please upload CSV or Excel.")
+
+def color_status(col: pd.Series) -> pd.Series:
+	return col.map(_STATUS_CSS)
+
+
+# Dtype hints for input data. Files are parsed with NumPy-backed dtypes so a
+# text cell in a numeric column loads as object instead of failing the read;
+# numeric columns are coerced during scoring without touching the uploaded values
+_INPUT_DTYPES = {
+	"Broker Name": "string[pyarrow]",
+	"KYC Completed (Y/N)": "category",
+}
+
+# pandas gained the calamine engine in 2.2; older versions keep the default reader
+_EXCEL_ENGINE = None
+if tuple(int(p) for p in pd.__version__.split(".")[:2]) >= (2, 2):
+	try:
+		import python_calamine  # noqa: F401
+		_EXCEL_ENGINE = "calamine"
+	except ImportError:
+		pass
 
 
+def load_input_dataframe(uploaded_file) -> pd.DataFrame:
+	if uploaded_file is None:
+		df = get_demo_dataset(30).convert_dtypes(dtype_backend="pyarrow")
+	else:
+		name = uploaded_file.name.lower()
+		if name.endswith(".csv"):
+			try:
+				df = pd.read_csv(uploaded_file, engine="pyarrow")
+			except pd.errors.ParserError:
+				# pyarrow rejects ragged rows; the C engine pads them with NaN
+				uploaded_file.seek(0)
+				df = pd.read_csv(uploaded_file)
+		elif name.endswith(".xls") or name.endswith(".xlsx"):
+			df = pd.read_excel(uploaded_file, engine=_EXCEL_ENGINE)
+		else:
+			raise ValueError("Unsupported file format. Please upload CSV or Excel.")
+
+	# Headers are stripped later in main, so match hints on the stripped name
+	# Cast via Arrow strings so all-empty (null-typed) columns convert cleanly
+	for c in df.columns:
+		dtype = _INPUT_DTYPES.get(str(c).strip())
+		if dtype is not None:
+			df[c] = df[c].astype("string[pyarrow]").astype(dtype)
+	return df
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS, max_entries=4)
 def prepare_scored_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 	required_cols = [
 		"Broker Name",
@@ -156,20 +212,69 @@ def prepare_scored_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 		raise ValueError(f"Missing required columns: {', '.join(missing)}")
 
 	# Compute score and flags
-	scores, flags = [], []
-	for _, row in df.iterrows():
-		s, f = compute_score_and_flags(row)
-		scores.append(s)
-		flags.append(", ".join(f) if f else "")
+	scores, flags = compute_score_and_flags(df)
+
+	# The caller hands over a freshly loaded frame, so add columns in place
+	df["Compliance Score"] = scores
+	df["Status"] = status_from_score(scores)
+	df["Failed Checks"] = flags
+	return df
+
+
+def chart_dataframe(scored_df: pd.DataFrame) -> pd.DataFrame:
+	# Only the columns the bar chart plots, highest score first
+	return scored_df[["Broker Name", "Compliance Score", "Status"]].sort_values(
+		"Compliance Score", ascending=False, kind="stable", ignore_index=True
+	)
+
 
-	result = df.copy()
-	result["Compliance Score"] = scores
-	result["Status"] = result["Compliance Score"].apply(status_from_score)
-	result["Failed Checks"] = flags
-	return result
+# Glyph replacements for the PDF fonts (e.g., en dash, non‑breaking hyphen)
+_NORMALIZE_TABLE = str.maketrans({
+	"–": "-",  # en dash
+	"—": "-",  # em dash
+	"‑": "-",  # non-breaking hyphen
+	"−": "-",  # minus sign
+	"“": '"',
+	"”": '"',
+	"‘": "'",
+	"’": "'",
+})
 
 
-def build_pdf_report(scored_df: pd.DataFrame, avg: float, hi: int, lo: int) -> bytes:
+def _normalize(text: str) -> str:
+	"""Replace characters the built-in PDF fonts cannot render."""
+	return "" if text is None else str(text).translate(_NORMALIZE_TABLE)
+
+
+_PDF_TABLE_STYLE = TableStyle([
+	('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+	('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+	('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+	('FONTSIZE', (0, 0), (-1, -1), 9),
+	('ALIGN', (1, 1), (2, -1), 'CENTER'),  # score & status centered
+	('VALIGN', (0, 0), (-1, -1), 'TOP'),
+	('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+	('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+])
+
+
+@functools.lru_cache(maxsize=1)
+def _pdf_styles() -> Tuple[StyleSheet1, ParagraphStyle, ParagraphStyle]:
+	# Built once per process and shared by every report
+	styles = getSampleStyleSheet()
+	cell_style = ParagraphStyle(
+		name="Cell",
+		parent=styles['Normal'],
+		fontSize=9,
+		leading=11,
+	)
+	header_style = ParagraphStyle(name="Header", parent=styles['BodyText'], fontSize=9)
+	return styles, cell_style, header_style
+
+
+# Keyed on the per-minute timestamp, so keep only the latest few reports
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS, max_entries=2)
+def build_pdf_report(scored_df: pd.DataFrame, avg: float, hi: int, lo: int, generated: str) -> bytes:
 	buffer = io.BytesIO()
 	# Landscape for wider tables
 	doc = SimpleDocTemplate(
@@ -180,41 +285,16 @@ def build_pdf_report(scored_df: pd.DataFrame, avg: float, hi: int, lo: int) -> b
 		topMargin=1.5*cm,
 		bottomMargin=1.5*cm,
 	)
-	styles = getSampleStyleSheet()
-	cell_style = ParagraphStyle(
-		name="Cell",
-		parent=styles['Normal'],
-		fontSize=9,
-		leading=11,
-	)
+	styles, cell_style, header_style = _pdf_styles()
 	story = []
 
-	# Normalize helper to avoid missing glyphs (e.g., en dash, non‑breaking hyphen)
-	def _normalize(text: str) -> str:
-		if text is None:
-			return ""
-		s = str(text)
-		replacements = {
-			"–": "-",  # en dash
-			"—": "-",  # em dash
-			"‑": "-",  # non-breaking hyphen
-			"−": "-",  # minus sign
-			"“": '"',
-			"”": '"',
-			"‘": "'",
-			"’": "'",
-		}
-		for k, v in replacements.items():
-			s = s.replace(k, v)
-		return s
-
 	# Title
 	story.append(Paragraph(_normalize("CompliScore – Compliance Health Dashboard"), styles['Title']))
 	story.append(Paragraph(_normalize("Low‑cost compliance monitoring for small and mid‑sized brokers"), styles['Normal']))
 	story.append(Spacer(1, 0.4 * cm))
 
 	# Summary
-	story.append(Paragraph(_normalize(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"), styles['Normal']))
+	story.append(Paragraph(_normalize(f"Generated: {generated}"), styles['Normal']))
 	story.append(Paragraph(_normalize(f"Average Score: <b>{avg:.1f}</b>"), styles['Normal']))
 	story.append(Paragraph(_normalize(f"Highest Score: <b>{hi}</b>"), styles['Normal']))
 	story.append(Paragraph(_normalize(f"Lowest Score: <b>{lo}</b>"), styles['Normal']))
@@ -223,34 +303,32 @@ def build_pdf_report(scored_df: pd.DataFrame, avg: float, hi: int, lo: int) -> b
 	# Table with wrapped cells and fixed column widths
 	columns = ["Broker Name", "Compliance Score", "Status", "Failed Checks"]
 	# Header row as Paragraphs to ensure consistent sizing
-	header_row = [Paragraph(_normalize(col), ParagraphStyle(name="Header", parent=styles['BodyText'], fontSize=9)) for col in columns]
+	header_row = [Paragraph(_normalize(col), header_style) for col in columns]
+	# Only the free-text columns can wrap or carry odd glyphs; normalize them in one pass
+	# (blank cells become "" since astype(str) keeps missing values in pandas 3)
+	# and stringify score/status up front so the row loop only walks Python objects
+	table_rows = pd.DataFrame({
+		"Broker Name": scored_df["Broker Name"].fillna("").astype(str).str.translate(_NORMALIZE_TABLE),
+		"Compliance Score": scored_df["Compliance Score"].astype(str),
+		"Status": scored_df["Status"].astype(str),
+		"Failed Checks": scored_df["Failed Checks"].fillna("").astype(str).str.translate(_NORMALIZE_TABLE),
+	}).to_numpy(dtype=object)
 	data_rows = []
-	for _, r in scored_df[columns].iterrows():
-		broker = Paragraph(_normalize(str(r["Broker Name"])), cell_style)
-		score = Paragraph(_normalize(str(r["Compliance Score"])), cell_style)
-		status = Paragraph(_normalize(str(r["Status"])), cell_style)
-		failed_text = str(r["Failed Checks"]) if str(r["Failed Checks"]) else "-"
-		failed = Paragraph(_normalize(failed_text), cell_style)
-		data_rows.append([broker, score, status, failed])
+	for broker, score, status, failed in table_rows:
+		# Score and status are short fixed strings, so plain cells skip Paragraph layout
+		data_rows.append([
+			Paragraph(broker, cell_style),
+			score,
+			status,
+			Paragraph(failed, cell_style),
+		])
 
 	# Column widths tuned for A4 landscape content width (~25.7 cm)
 	col_widths = [7*cm, 3*cm, 3.5*cm, 12*cm]
-	t = Table([header_row] + data_rows, colWidths=col_widths, repeatRows=1)
-	t.setStyle(TableStyle([
-		('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-		('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-		('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-		('FONTSIZE', (0, 0), (-1, -1), 9),
-		('ALIGN', (1, 1), (2, -1), 'CENTER'),  # score & status centered
-		('VALIGN', (0, 0), (-1, -1), 'TOP'),
-		('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-		('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-	]))
-	story.append(t)
+	story.append(Table([header_row] + data_rows, colWidths=col_widths, repeatRows=1, style=_PDF_TABLE_STYLE))
 
 	doc.build(story)
-	buffer.seek(0)
-	return buffer.read()
+	return buffer.getvalue()
 
 
 def main() -> None:
@@ -294,12 +372,9 @@ def main() -> None:
 	col3.metric("Lowest Score", f"{lowest}")
 
 	# Table with colored status
-	styled = scored_df.copy()
-	def color_status(val: str) -> str:
-		return f"color: white; background-color: {color_for_status(val)}" if val in ["Green", "Yellow", "Red"] else ""
 	st.markdown("### Broker Compliance Table")
 	st.dataframe(
-		styled[[
+		scored_df[[
 			"Broker Name",
 			"KYC Completed (Y/N)",
 			"Capital Adequacy %",
@@ -308,7 +383,7 @@ def main() -> None:
 			"Compliance Score",
 			"Status",
 			"Failed Checks",
-		]].style.applymap(color_status, subset=["Status"]),
+		]].style.apply(color_status, subset=["Status"]),
 		width='stretch',
 		hide_index=True,
 	)
@@ -316,15 +391,11 @@ def main() -> None:
 	# Bar chart
 	st.markdown("### Compliance Scores Distribution")
 	fig = px.bar(
-		scored_df.sort_values("Compliance Score", ascending=False),
+		chart_dataframe(scored_df),
 		x="Broker Name",
 		y="Compliance Score",
 		color="Status",
-		color_discrete_map={
-			"Compliant": "#2e7d32",
-			"Needs Attention": "#f9a825",
-			"Non-Compliant": "#c62828",
-		},
+		color_discrete_map=_STATUS_COLORS,
 		height=500,
 	)
 	fig.update_layout(xaxis_tickangle=-30, template="plotly_white")
@@ -332,13 +403,21 @@ def main() -> None:
 
 	# Export PDF
 	st.markdown("### Export Report")
-	pdf_bytes = build_pdf_report(scored_df, avg_score, highest, lowest)
-	st.download_button(
-		label="Download PDF Report",
-		data=pdf_bytes,
-		file_name=f"CompliScore_Report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-		mime="application/pdf",
-	)
+	# Build the PDF only once requested for the data on screen; a new upload
+	# needs another click before its report is built
+	data_key = "demo" if uploaded is None else uploaded.file_id
+	if st.button("Prepare PDF Report"):
+		st.session_state["pdf_requested_for"] = data_key
+	if st.session_state.get("pdf_requested_for") == data_key:
+		# The timestamp is an argument so cached reports never carry a stale one
+		now = datetime.now()
+		pdf_bytes = build_pdf_report(scored_df, avg_score, highest, lowest, now.strftime('%Y-%m-%d %H:%M'))
+		st.download_button(
+			label="Download PDF Report",
+			data=pdf_bytes,
+			file_name=f"CompliScore_Report_{now.strftime('%Y%m%d_%H%M')}.pdf",
+			mime="application/pdf",
+		)
 
 
 if __name__ == "__main__":